@@ -11,6 +11,9 @@ import argparse
 import subprocess
 import random
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from video_splicing import run_ffmpeg
 
 # Configure logging
 logging.basicConfig(
@@ -60,10 +63,10 @@ def generate_test_video(output_path, duration=5, color="red", text=None):
     
     try:
         logging.info(f"Generating test video: {output_path}")
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        run_ffmpeg(cmd)
         return True
     except subprocess.CalledProcessError as e:
-        logging.error(f"FFmpeg error: {e.stderr.decode() if e.stderr else str(e)}")
+        logging.error(f"FFmpeg error: {e.stderr if e.stderr else str(e)}")
         return False
 
 def main():
@@ -77,35 +80,39 @@ def main():
     # Create output directory if it doesn't exist
     os.makedirs(args.output, exist_ok=True)
     
-    # Generate random test videos
-    videos_created = 0
-    teacher_counts = {}
-    
-    for _ in range(args.count):
-        # Select random teacher and student
-        teacher = random.choice(TEACHERS)
-        student = random.choice(STUDENTS)
-        
-        teacher_name = f"{teacher[0]}_{teacher[1]}"
-        if teacher_name not in teacher_counts:
-            teacher_counts[teacher_name] = 0
-        teacher_counts[teacher_name] += 1
-        
-        # Generate a random color
-        colors = ["red", "blue", "green", "yellow", "purple", "orange", "pink", "cyan"]
-        color = random.choice(colors)
-        
+    # Pick random teacher/student pairs. Picking the same pair twice would
+    # write the same file, so later picks replace earlier ones.
+    colors = ["red", "blue", "green", "yellow", "purple", "orange", "pink", "cyan"]
+    teachers = random.choices(TEACHERS, k=args.count)
+    students = random.choices(STUDENTS, k=args.count)
+    picked_colors = random.choices(colors, k=args.count)
+    titled_teachers = {teacher: f"{teacher[0].title()} {teacher[1].title()}" for teacher in set(teachers)}
+
+    jobs = {}
+    for teacher, student, color in zip(teachers, students, picked_colors):
         # Create filename
         filename = f"{teacher[0]}_{teacher[1]}_{student}.mp4"
         output_path = os.path.join(args.output, filename)
-        
+
         # Generate text for the video
-        text = f"Teacher: {teacher[0].title()} {teacher[1].title()}\nStudent: {student.title()}"
-        
-        # Generate the test video
-        if generate_test_video(output_path, args.duration, color, text):
-            videos_created += 1
-    
+        text = f"Teacher: {titled_teachers[teacher]}\nStudent: {student.title()}"
+
+        jobs[output_path] = (teacher, color, text)
+
+    teacher_counts = {}
+    for teacher, _, _ in jobs.values():
+        teacher_name = f"{teacher[0]}_{teacher[1]}"
+        teacher_counts[teacher_name] = teacher_counts.get(teacher_name, 0) + 1
+
+    # Each clip is a separate ffmpeg process, so run several at once to
+    # overlap their startup and encode time
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        futures = [
+            executor.submit(generate_test_video, output_path, args.duration, color, text)
+            for output_path, (_, color, text) in jobs.items()
+        ]
+        videos_created = sum(1 for future in futures if future.result())
+
     # Print summary
     print(f"\nGenerated {videos_created} test videos in {args.output}")
     print("\nVideos per teacher:")
@@ -10,15 +10,19 @@ Video naming format: teacherfirstname_teacherlastname_studentname.extension
 
 import os
 import re
+import json
 import subprocess
 import argparse
-from collections import defaultdict
+from collections import defaultdict, deque
 import shutil
 import logging
 import shlex
 import tempfile
 import sys
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from operator import itemgetter
 
 # Configure logging
 logging.basicConfig(
@@ -28,9 +32,346 @@ logging.basicConfig(
 
 # Common video formats as of 2025
 VIDEO_EXTENSIONS = ['.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v', '.wmv', '.flv']
+VIDEO_EXTENSION_SET = frozenset(VIDEO_EXTENSIONS)
+
+# Number of parallel workers for video processing. Normalization jobs split
+# the cores between workers (see resolve_encoding) so workers x threads
+# roughly matches the core count.
+MAX_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+
+# ffprobe results keyed by absolute path; each entry records the file's
+# modification time and size so changed files are probed again. The cache is
+# saved next to the temporary directory between runs, keeping the students'
+# file paths out of the output directory.
+PROBE_CACHE_FILE = '.probe_cache.json'
+_probe_cache = {}
+
+# Title cards created during this run, keyed by their text and look, so
+# cards that recur across teachers (students sharing a name) are created once
+_title_card_cache = {}
+
+# Characters that must be backslash-escaped in an FFmpeg concat list entry
+CONCAT_SPECIAL_CHARS = re.compile(r"([\\'\s])")
+
+# Number of FFmpeg stderr lines kept for error reporting
+STDERR_TAIL_LINES = 100
+
+# Standard resolution and frame rate for all videos - using portrait orientation
+TARGET_WIDTH = 720
+TARGET_HEIGHT = 1280
+TARGET_FPS = 30
+
+# Keyframe interval of every encode, two seconds at the target frame rate
+GOP_SIZE = 2 * TARGET_FPS
+
+# Video track timescale of every intermediate file, including stream-copied
+# ones, so the concat demuxer joins them without rounding their timestamps
+MP4_TIMESCALE_ARGS = ['-video_track_timescale', '90000']
+
+# EBU R128 loudness normalization
+LOUDNORM_FILTER = 'loudnorm=I=-16:TP=-1.5:LRA=11'
+
+# Hardware H.264 encoders in order of preference, used in place of libx264
+# when FFmpeg supports them and the host has the hardware to back them
+HW_ENCODERS = ['h264_nvenc', 'h264_qsv', 'h264_vaapi', 'h264_videotoolbox']
+VAAPI_DEVICE = '/dev/dri/renderD128'
+
+# Most concurrent NVENC sessions to test for; consumer GeForce cards
+# typically allow a handful, professional cards are unlimited
+NVENC_MAX_SESSIONS = 8
+# Seconds to wait for each NVENC test session to open its encoder before
+# counting it as failed
+NVENC_SESSION_TIMEOUT = 10
+
+# Most inputs, title cards included, given to one single-pass FFmpeg run;
+# larger filtergraphs get slow to set up and can exhaust open file limits
+MAX_SINGLE_PASS_INPUTS = 64
+
+# Default encoder settings. Normalized clips are intermediates that get
+# stream-copied into the final video, so a fast preset is a good trade-off.
+# A thread count of 0 means "pick automatically based on the number of
+# parallel jobs". fast selects the quickest hardware encoder preset, and
+# loudnorm applies LOUDNORM_FILTER to the students' audio.
+DEFAULT_ENCODING = {
+    'encoder': 'libx264',
+    'preset': 'veryfast',
+    'crf': 23,
+    'threads': 0,
+    'fast': False,
+    'loudnorm': True,
+}
+
+# libx264 settings used by --fast; the lower CRF makes up for the quality
+# ultrafast loses
+FAST_PRESET = 'ultrafast'
+FAST_CRF = 20
+
+
+def run_ffmpeg(cmd, log_prefix='ffmpeg'):
+    """
+    Run an FFmpeg command, streaming its stderr to the debug log as it runs.
+    Only the last STDERR_TAIL_LINES lines are kept in memory, so long encodes
+    can't fill the pipe or grow an unbounded buffer. Raises
+    subprocess.CalledProcessError with that tail as stderr on failure.
+    """
+    # Without debug logging nobody reads FFmpeg's banner, stream details or
+    # progress stats, so have it write only warnings and errors
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    if debug:
+        cmd = [cmd[0], '-hide_banner', *cmd[1:]]
+    else:
+        cmd = [cmd[0], '-hide_banner', '-nostats', '-loglevel', 'warning', *cmd[1:]]
+
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+    # stdout is discarded, so reading stderr in this thread can't deadlock.
+    # FFmpeg echoes file names and metadata that needn't be valid UTF-8, so
+    # undecodable bytes are replaced rather than raising mid-read
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               universal_newlines=True, encoding='utf-8', errors='replace', bufsize=1)
+    with process.stderr:
+        for line in process.stderr:
+            line = line.rstrip()
+            if line:
+                tail.append(line)
+                # Skip formatting the message at all when it would be dropped
+                if debug:
+                    logging.debug(f"{log_prefix}: {line}")
+    returncode = process.wait()
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr='\n'.join(tail))
+
+
+def resolve_encoding(encoding, parallel_jobs):
+    """
+    Return a copy of the encoding settings with the thread count resolved,
+    splitting the CPU cores between parallel_jobs concurrent FFmpeg processes.
+    """
+    if encoding['threads'] > 0:
+        return dict(encoding)
+    threads = max(1, (os.cpu_count() or 1) // max(1, parallel_jobs))
+    return dict(encoding, threads=threads)
+
+
+def encoder_input_args(encoding):
+    """Return the FFmpeg arguments that must precede the inputs for the encoder."""
+    args = []
+    if encoding['encoder'] == 'h264_vaapi':
+        args.extend(['-vaapi_device', VAAPI_DEVICE])
+    if encoding['threads'] > 0:
+        # Filters and decoders otherwise start a thread per core in every
+        # FFmpeg process, which thrashes when several jobs run in parallel.
+        # -filter_threads only covers -vf/-af graphs, so -filter_complex
+        # graphs (the single pass and title cards) need their own option
+        args.extend([
+            '-filter_threads', str(encoding['threads']),
+            '-filter_complex_threads', str(encoding['threads']),
+        ])
+    return args
+
+
+def input_args(encoding, path):
+    """
+    Return the -i arguments for an input, capping its decoder threads.
+    With NVENC or VAAPI the input is decoded on the GPU as well; FFmpeg falls
+    back to software decoding for codecs the GPU can't handle.
+    """
+    args = []
+    if encoding['encoder'] == 'h264_nvenc':
+        args.extend(['-hwaccel', 'cuda'])
+    elif encoding['encoder'] == 'h264_vaapi':
+        args.extend(['-hwaccel', 'vaapi', '-hwaccel_device', VAAPI_DEVICE])
+    if encoding['threads'] > 0:
+        args.extend(['-threads', str(encoding['threads'])])
+    args.extend(['-i', path])
+    return args
+
+
+def video_filter_args(encoding, *filters):
+    """
+    Return a -vf argument chaining the given filters, followed by the upload
+    to GPU memory that VAAPI needs. Returns an empty list if there's nothing to do.
+    """
+    chain = list(filters)
+    if encoding['encoder'] == 'h264_vaapi':
+        chain.append('format=nv12,hwupload')
+    return ['-vf', ','.join(chain)] if chain else []
+
+
+def audio_filter_args(encoding):
+    """Return the -af loudness normalization argument, if it's enabled."""
+    return ['-af', LOUDNORM_FILTER] if encoding['loudnorm'] else []
+
+
+def video_encoder_args(encoding):
+    """Return the FFmpeg video encoder arguments for the given settings."""
+    encoder = encoding['encoder']
+    quality = str(encoding['crf'])
+
+    if encoder == 'h264_nvenc':
+        # Constant-quality VBR; high profile yuv420p still plays in QuickTime,
+        # so NVENC doesn't need libx264's baseline restriction
+        args = [
+            '-c:v', encoder,
+            '-preset', 'p2' if encoding['fast'] else 'p4',
+            '-tune', 'hq',
+            '-rc', 'vbr',
+            '-cq', quality,
+            '-b:v', '0',
+            '-profile:v', 'high',
+            '-pix_fmt', 'yuv420p',
+            '-forced-idr', '1',
+        ]
+    elif encoder == 'h264_qsv':
+        args = ['-c:v', encoder, '-preset', 'medium', '-global_quality', quality, '-pix_fmt', 'nv12']
+    elif encoder == 'h264_vaapi':
+        args = ['-c:v', encoder, '-qp', quality]
+    elif encoder == 'h264_videotoolbox':
+        args = ['-c:v', encoder, '-b:v', '6M', '-pix_fmt', 'yuv420p']
+    else:
+        args = [
+            '-c:v', 'libx264',
+            '-pix_fmt', 'yuv420p',
+            '-profile:v', 'baseline',
+            '-level', '3.0',
+            '-preset', encoding['preset'],
+            '-crf', quality,
+            '-refs', '1',
+            '-threads', str(encoding['threads']),
+        ]
+
+    # Fixed-length GOPs without scene-cut keyframes or B-frames give the
+    # normalized clips and title cards the same stream structure, keeping
+    # them safe to join with the concat demuxer's stream copy
+    return args + ['-g', str(GOP_SIZE), '-keyint_min', str(GOP_SIZE), '-sc_threshold', '0', '-bf', '0']
+
+
+def hw_encoder_works(encoder):
+    """Check that a hardware encoder can actually encode a frame on this host."""
+    encoding = dict(DEFAULT_ENCODING, encoder=encoder)
+    cmd = [
+        'ffmpeg',
+        *encoder_input_args(encoding),
+        '-f', 'lavfi',
+        '-i', f'color=c=black:s={TARGET_WIDTH}x{TARGET_HEIGHT}:d=0.1',
+        '-frames:v', '1',
+        *video_filter_args(encoding),
+        *video_encoder_args(encoding),
+        '-f', 'null',
+        '-'
+    ]
+
+    try:
+        run_ffmpeg(cmd)
+        return True
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+
+def _wait_for_output_header(process, started):
+    """
+    Read an FFmpeg process's stderr until it prints its output header, which
+    it does once the encoder has opened, or exits without it because opening
+    failed. Appends whether the header was seen to started.
+    """
+    started.append(any(line.startswith(b'Output #0') for line in process.stderr))
+
+
+def nvenc_session_limit(max_sessions=NVENC_MAX_SESSIONS):
+    """
+    Return how many NVENC encodes this GPU can run at once, up to max_sessions.
+    Starts max_sessions encodes reading raw frames from their stdin. Each is
+    fed a single frame, which makes it open its encoder, and then kept
+    waiting for more, so every session that opened is still open while the
+    rest are checked.
+    """
+    encoding = dict(DEFAULT_ENCODING, encoder='h264_nvenc')
+    cmd = [
+        'ffmpeg',
+        '-hide_banner',
+        '-nostats',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'yuv420p',
+        '-s', f'{TARGET_WIDTH}x{TARGET_HEIGHT}',
+        '-r', str(TARGET_FPS),
+        '-i', '-',
+        *video_encoder_args(encoding),
+        '-f', 'null',
+        '-'
+    ]
+    frame = bytes(TARGET_WIDTH * TARGET_HEIGHT * 3 // 2)
+
+    processes = []
+    opened = 0
+    try:
+        for _ in range(max_sessions):
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE)
+            processes.append(process)
+            try:
+                process.stdin.write(frame)
+                process.stdin.flush()
+            except OSError:
+                continue
+            # Read stderr in a thread, so a session that stalls before
+            # opening its encoder can't hang startup
+            started = []
+            reader = threading.Thread(target=_wait_for_output_header, args=(process, started), daemon=True)
+            reader.start()
+            reader.join(NVENC_SESSION_TIMEOUT)
+            if reader.is_alive():
+                logging.warning(f"NVENC test session didn't start within {NVENC_SESSION_TIMEOUT}s")
+                process.kill()
+                reader.join()
+            elif started[0]:
+                opened += 1
+    except OSError as e:
+        logging.warning(f"Failed to test NVENC sessions: {str(e)}")
+    finally:
+        for process in processes:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+        for process in processes:
+            try:
+                process.wait(NVENC_SESSION_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            process.stderr.close()
+
+    # detect_hw_encoder has already checked that one session works
+    return max(1, opened)
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_encoders():
+    """Return the `ffmpeg -encoders` listing, running FFmpeg only once per process."""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True, encoding='utf-8', errors='replace')
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return result.stdout
+
 
-# Number of parallel workers for video processing
-MAX_WORKERS = 4
+def has_encoder(name):
+    """Check whether this FFmpeg build includes the named encoder."""
+    return re.search(rf'\b{re.escape(name)}\b', ffmpeg_encoders()) is not None
+
+
+def detect_hw_encoder():
+    """
+    Return the first hardware H.264 encoder from HW_ENCODERS that FFmpeg
+    supports and that works on this host, or 'libx264' if there is none.
+    """
+    for encoder in HW_ENCODERS:
+        # Builds often list encoders whose hardware isn't present, so test it
+        if has_encoder(encoder) and hw_encoder_works(encoder):
+            return encoder
+    return 'libx264'
 
 
 def print_progress(current, total, prefix="Progress", bar_length=40):
@@ -44,44 +385,170 @@ def print_progress(current, total, prefix="Progress", bar_length=40):
         print()  # New line when complete
 
 
-def create_title_card(text, output_path, duration=2.0, font_size=48, bg_color="black", text_color="white"):
+def drawtext_filter(text, font_size, text_color):
+    """Return a drawtext filter centering text on the frame."""
+    # Escape special characters for FFmpeg drawtext filter
+    escaped_text = text.replace("'", "'\\''").replace(":", "\\:")
+    return f"drawtext=text='{escaped_text}':fontsize={font_size}:fontcolor={text_color}:x=(w-text_w)/2:y=(h-text_h)/2"
+
+
+def create_title_card(text, output_path, duration=2.0, font_size=48, bg_color="black", text_color="white",
+                      encoding=DEFAULT_ENCODING):
     """
     Create a title card video with text using FFmpeg.
     """
-    # Escape special characters for FFmpeg drawtext filter
-    escaped_text = text.replace("'", "'\\''").replace(":", "\\:")
+    job_encoding = resolve_encoding(encoding, 1)
 
     cmd = [
         'ffmpeg',
         '-y',
+        *encoder_input_args(job_encoding),
         '-f', 'lavfi',
-        '-i', f'color=c={bg_color}:s=720x1280:d={duration}:r=30',
+        '-i', f'color=c={bg_color}:s={TARGET_WIDTH}x{TARGET_HEIGHT}:d={duration}:r={TARGET_FPS}',
         '-f', 'lavfi',
         '-i', f'anullsrc=r=48000:cl=stereo',
         '-t', str(duration),
-        '-vf', f"drawtext=text='{escaped_text}':fontsize={font_size}:fontcolor={text_color}:x=(w-text_w)/2:y=(h-text_h)/2",
-        '-c:v', 'libx264',
-        '-pix_fmt', 'yuv420p',
-        '-profile:v', 'baseline',
-        '-level', '3.0',
+        *video_filter_args(job_encoding, drawtext_filter(text, font_size, text_color)),
+        *video_encoder_args(job_encoding),
         '-c:a', 'aac',
         '-b:a', '256k',
         '-ar', '48000',
         '-ac', '2',
-        '-movflags', '+faststart',
         '-shortest',
+        *MP4_TIMESCALE_ARGS,
         output_path
     ]
 
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        run_ffmpeg(cmd)
         logging.info(f"Created title card: {text}")
         return output_path
     except subprocess.CalledProcessError as e:
-        logging.error(f"Failed to create title card: {e.stderr.decode() if e.stderr else str(e)}")
+        logging.error(f"Failed to create title card: {e.stderr if e.stderr else str(e)}")
         return None
 
 
+def create_title_cards(cards, bg_color="black", text_color="white", encoding=DEFAULT_ENCODING, max_outputs=1):
+    """
+    Create title cards, reusing identical cards made earlier in this run.
+    cards is a list of (text, output_path, duration, font_size) tuples.
+    Reused cards are hard-linked (or copied) into place and the rest are
+    rendered in batches by render_title_cards (see max_outputs there).
+    Returns a list aligned with cards holding each output path, or None
+    where a card couldn't be created.
+    """
+    results = {}
+    pending = []
+
+    for card in cards:
+        text, output_path, duration, font_size = card
+        cached = _title_card_cache.get((text, duration, font_size, bg_color, text_color))
+        try:
+            if cached == output_path and os.path.exists(output_path):
+                results[output_path] = output_path
+                continue
+            # output_path is about to get new contents, so forget whichever
+            # card it held; a later card must not be linked to the wrong name
+            for key in [key for key, path in list(_title_card_cache.items()) if path == output_path]:
+                _title_card_cache.pop(key, None)
+            # Remove any earlier file first: it may be a hard link to another
+            # card, which FFmpeg would otherwise overwrite through the link
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            if cached and cached != output_path:
+                try:
+                    os.link(cached, output_path)
+                except OSError:
+                    shutil.copyfile(cached, output_path)
+                results[output_path] = output_path
+                continue
+        except OSError as e:
+            logging.warning(f"Couldn't reuse title card for {output_path}: {str(e)}")
+        pending.append(card)
+
+    for (text, output_path, duration, font_size), result in zip(
+            pending, render_title_cards(pending, bg_color, text_color, encoding, max_outputs)):
+        results[output_path] = result
+        if result:
+            _title_card_cache[(text, duration, font_size, bg_color, text_color)] = result
+
+    if len(pending) < len(cards):
+        logging.info(f"Reused {len(cards) - len(pending)} title card(s)")
+    return [results[output_path] for _, output_path, _, _ in cards]
+
+
+def render_title_cards(cards, bg_color="black", text_color="white", encoding=DEFAULT_ENCODING, max_outputs=1):
+    """
+    Render title cards in batches, one FFmpeg run per batch and one output
+    file per card. Every output opens its own encoder, so a batch holds at
+    most max_outputs cards with a hardware encoder (the sessions this job
+    may use) and no more cards than libx264 has threads to share between
+    them. Falls back to creating a batch's cards one at a time if it fails.
+    Returns a list aligned with cards holding each output path, or None
+    where a card couldn't be created.
+    """
+    if not cards:
+        return []
+
+    job_encoding = resolve_encoding(encoding, 1)
+
+    if job_encoding['encoder'] == 'libx264':
+        batch_size = max(1, job_encoding['threads'])
+    else:
+        batch_size = max(1, max_outputs)
+    if len(cards) > batch_size:
+        return [
+            result
+            for start in range(0, len(cards), batch_size)
+            for result in render_title_cards(cards[start:start + batch_size], bg_color, text_color,
+                                             encoding, max_outputs)
+        ]
+
+    # The job's threads are split between the card encoders
+    output_encoding = dict(job_encoding, threads=max(1, job_encoding['threads'] // len(cards)))
+
+    # One color source per card; the silent audio source is shared and each
+    # output is cut to its card's duration
+    cmd = ['ffmpeg', '-y', *encoder_input_args(job_encoding)]
+    for _, _, duration, _ in cards:
+        cmd.extend(['-f', 'lavfi', '-i', f'color=c={bg_color}:s={TARGET_WIDTH}x{TARGET_HEIGHT}:d={duration}:r={TARGET_FPS}'])
+    cmd.extend(['-f', 'lavfi', '-i', 'anullsrc=r=48000:cl=stereo'])
+    audio_input = len(cards)
+
+    filters = [
+        f"[{i}:v]{video_filter_args(job_encoding, drawtext_filter(text, font_size, text_color))[1]}[v{i}]"
+        for i, (text, _, _, font_size) in enumerate(cards)
+    ]
+    cmd.extend(['-filter_complex', ';'.join(filters)])
+
+    for i, (_, output_path, duration, _) in enumerate(cards):
+        cmd.extend([
+            '-map', f'[v{i}]',
+            '-map', f'{audio_input}:a',
+            '-t', str(duration),
+            *video_encoder_args(output_encoding),
+            '-c:a', 'aac',
+            '-b:a', '256k',
+            '-ar', '48000',
+            '-ac', '2',
+            *MP4_TIMESCALE_ARGS,
+            output_path
+        ])
+
+    try:
+        run_ffmpeg(cmd)
+        logging.info(f"Created {len(cards)} title card(s)")
+        return [output_path for _, output_path, _, _ in cards]
+    except subprocess.CalledProcessError as e:
+        logging.warning(f"Batched title cards failed, creating them one at a time: {e.stderr if e.stderr else str(e)}")
+
+    return [
+        create_title_card(text, output_path, duration=duration, font_size=font_size,
+                          bg_color=bg_color, text_color=text_color, encoding=encoding)
+        for text, output_path, duration, font_size in cards
+    ]
+
+
 def format_teacher_name(teacher_key):
     """Convert teacher_first_teacher_last to 'Teacher First Last' format."""
     parts = teacher_key.split('_')
@@ -98,40 +565,62 @@ def parse_filename(filename):
     """
     Parse a filename to extract teacher and student names.
     Expected format: teacherfirstname_teacherlastname_studentname.extension
+    Returns (None, None) if any of the three names is missing.
     """
-    base_name = os.path.splitext(filename)[0]
-    parts = base_name.split('_')
-    
-    if len(parts) < 3:
+    base_name, dot, _ = filename.rpartition('.')
+    if not dot:
+        base_name = filename
+
+    teacher_first_name, _, rest = base_name.partition('_')
+    # Everything after the second underscore, in case student name has underscores
+    teacher_last_name, _, student_name = rest.partition('_')
+
+    if not (teacher_first_name and teacher_last_name and student_name):
         return None, None
-    
-    teacher_first_name = parts[0]
-    teacher_last_name = parts[1]
-    student_name = '_'.join(parts[2:])  # In case student name has underscores
-    
+
     return f"{teacher_first_name}_{teacher_last_name}", student_name
 
 def is_video_file(filename):
     """Check if a file is a video based on its extension."""
-    _, ext = os.path.splitext(filename)
-    return ext.lower() in VIDEO_EXTENSIONS
-
-def create_concat_file(video_files, concat_file_path):
-    """Create a concat file for FFmpeg to use for concatenation."""
-    with open(concat_file_path, 'w') as f:
-        for video_file in video_files:
-            # Escape single quotes in the file path
-            escaped_path = video_file.replace("'", "'\\''")
-            # Make sure we're using the absolute path to avoid path issues
-            if not os.path.isabs(escaped_path):
-                escaped_path = os.path.abspath(escaped_path)
-            f.write(f"file '{escaped_path}'\n")
-
-def concatenate_videos(video_files, output_file, temp_dir):
+    dot = filename.rfind('.')
+    return dot >= 0 and filename[dot:].lower() in VIDEO_EXTENSION_SET
+
+def create_concat_file(video_files, concat_file_path, durations=None):
+    """
+    Create a concat file for FFmpeg to use for concatenation.
+    If durations are given, each file gets a duration directive, which the
+    concat demuxer uses in place of the duration stored in the file.
+    """
+    # Make sure we're using absolute paths to avoid path issues
+    abspaths = [os.path.abspath(video_file) for video_file in video_files]
+    # Backslash-escape the characters the concat demuxer treats specially
+    escaped_paths = [CONCAT_SPECIAL_CHARS.sub(r'\\\1', path) for path in abspaths]
+    if durations is None:
+        durations = [None] * len(escaped_paths)
+    # Build the whole list first so it's written with a single call. FFmpeg
+    # reads the list as UTF-8, and a large bytes write bypasses the buffer
+    # instead of being split into buffer-sized writes like text mode does.
+    # surrogateescape writes the original bytes of filenames that aren't
+    # valid UTF-8 instead of raising
+    body = ''.join(
+        f"file {path}\n" + (f"duration {duration:.6f}\n" if duration is not None else '')
+        for path, duration in zip(escaped_paths, durations)
+    )
+    with open(concat_file_path, 'wb') as f:
+        f.write(body.encode('utf-8', 'surrogateescape'))
+
+def concatenate_videos(video_files, output_file, temp_dir, stream_copy=True, encoding=DEFAULT_ENCODING,
+                       durations=None):
     """
     Concatenate video files using FFmpeg with consistent settings.
     Since all videos have been normalized with the same audio settings,
     we can safely concatenate them without audio issues.
+
+    With stream_copy the concat demuxer copies the streams as-is and only
+    falls back to re-encoding if FFmpeg fails. Pass stream_copy=False when the
+    inputs were not normalized, since copying mismatched streams can succeed
+    but produce a broken video. durations, if given, are written to the
+    concat list (see create_concat_file).
     """
     if not video_files:
         logging.warning(f"No videos to concatenate for {output_file}")
@@ -139,132 +628,356 @@ def concatenate_videos(video_files, output_file, temp_dir):
     
     # Create a temporary concat file
     concat_file = os.path.join(temp_dir, f"concat_{os.path.basename(output_file)}.txt")
-    create_concat_file(video_files, concat_file)
+    create_concat_file(video_files, concat_file, durations)
+
+    # Write to a partial file and move it into place once FFmpeg succeeds, so
+    # an interrupted run never leaves a truncated video behind
+    part_file = output_file + '.part'
     
-    # Use the concat demuxer with consistent settings
-    cmd = [
+    if stream_copy:
+        # Use the concat demuxer with consistent settings
+        cmd = [
+            'ffmpeg',
+            '-y',
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', concat_file,
+            '-c:v', 'copy',  # Copy video stream to preserve quality
+            '-c:a', 'copy',  # Copy audio stream (already normalized)
+            '-movflags', '+faststart',  # Optimize for streaming
+            '-f', 'mp4',
+            part_file
+        ]
+
+        try:
+            logging.info(f"Running FFmpeg command: {' '.join(cmd)}")
+            run_ffmpeg(cmd)
+            os.replace(part_file, output_file)
+            logging.info(f"Successfully created {output_file}")
+            return True
+        except subprocess.CalledProcessError as e:
+            logging.error(f"FFmpeg encoding error: {e.stderr if e.stderr else str(e)}")
+            # If the simple concatenation fails, try with minimal re-encoding
+            logging.info("Trying alternative concatenation method...")
+
+    job_encoding = resolve_encoding(encoding, 1)
+    alt_cmd = [
         'ffmpeg',
         '-y',
+        *encoder_input_args(job_encoding),
         '-f', 'concat',
         '-safe', '0',
-        '-i', concat_file,
-        '-c:v', 'copy',  # Copy video stream to preserve quality
-        '-c:a', 'copy',  # Copy audio stream (already normalized)
+        *input_args(job_encoding, concat_file),
+        *video_filter_args(job_encoding),
+        *video_encoder_args(job_encoding),  # Re-encode video
+        '-c:a', 'aac',  # Convert audio to AAC
+        '-b:a', '256k',  # Use a high bitrate for good audio quality
+        '-ar', '48000',  # Standard audio sample rate
+        '-ac', '2',      # Stereo audio (2 channels)
         '-movflags', '+faststart',  # Optimize for streaming
-        output_file
+        '-f', 'mp4',
+        part_file
     ]
-    
+
     try:
-        logging.info(f"Running FFmpeg command: {' '.join(cmd)}")
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        logging.info(f"Successfully created {output_file}")
+        logging.info(f"Running re-encoding FFmpeg command: {' '.join(alt_cmd)}")
+        run_ffmpeg(alt_cmd)
+        os.replace(part_file, output_file)
+        logging.info(f"Successfully created {output_file} with re-encoding")
         return True
+    except subprocess.CalledProcessError as e2:
+        logging.error(f"Re-encoding concatenation failed: {e2.stderr if e2.stderr else str(e2)}")
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        return False
+
+def load_probe_cache(cache_file):
+    """
+    Load ffprobe results saved by a previous run into the in-memory cache.
+    Malformed entries are skipped, so those files are simply probed again.
+    """
+    try:
+        with open(cache_file) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return
+    if not isinstance(entries, dict):
+        return
+
+    _probe_cache.update(
+        (path, entry) for path, entry in entries.items()
+        if isinstance(entry, dict)
+        and isinstance(entry.get('mtime_ns'), int)
+        and isinstance(entry.get('size'), int)
+        and isinstance(entry.get('probe'), dict)
+        and isinstance(entry['probe'].get('streams', []), list)
+        and all(isinstance(stream, dict) for stream in entry['probe'].get('streams', []))
+    )
+
+
+def save_probe_cache(cache_file, exclude_dir=None):
+    """
+    Save the ffprobe cache for the next run, skipping files that no longer
+    exist and anything under exclude_dir (the temporary directory).
+    """
+    exclude_prefix = os.path.join(os.path.abspath(exclude_dir), '') if exclude_dir else None
+    entries = {
+        path: entry for path, entry in _probe_cache.items()
+        if os.path.exists(path) and not (exclude_prefix and path.startswith(exclude_prefix))
+    }
+
+    try:
+        with open(cache_file, 'w') as f:
+            json.dump(entries, f)
+    except OSError as e:
+        logging.warning(f"Failed to save probe cache: {str(e)}")
+
+
+def probe_video(video_file):
+    """
+    Probe a video file with ffprobe.
+    Returns the parsed JSON (with 'streams' and 'format' keys) or None on failure.
+    Results are cached by path, modification time and size, so unchanged
+    files are only probed once.
+    """
+    path = os.path.abspath(video_file)
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        logging.warning(f"Failed to probe {video_file}: {str(e)}")
+        return None
+
+    cached = _probe_cache.get(path)
+    if cached and cached['mtime_ns'] == st.st_mtime_ns and cached['size'] == st.st_size:
+        return cached['probe']
+
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_streams',
+        '-show_format',
+        video_file
+    ]
+
+    try:
+        result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True, encoding='utf-8', errors='replace')
+        probe = json.loads(result.stdout)
     except subprocess.CalledProcessError as e:
-        logging.error(f"FFmpeg encoding error: {e.stderr.decode() if e.stderr else str(e)}")
-        # If the simple concatenation fails, try with minimal re-encoding
-        try:
-            logging.info("Trying alternative concatenation method...")
-            alt_cmd = [
-                'ffmpeg',
-                '-y',
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', concat_file,
-                '-c:v', 'libx264',  # Re-encode video
-                '-pix_fmt', 'yuv420p',  # Ensure QuickTime compatibility
-                '-profile:v', 'baseline',  # Use baseline profile for better compatibility
-                '-level', '3.0',
-                '-c:a', 'aac',  # Convert audio to AAC
-                '-b:a', '256k',  # Use a high bitrate for good audio quality
-                '-ar', '48000',  # Standard audio sample rate
-                '-ac', '2',      # Stereo audio (2 channels)
-                '-movflags', '+faststart',  # Optimize for streaming
-                output_file
-            ]
-            logging.info(f"Running alternative FFmpeg command: {' '.join(alt_cmd)}")
-            subprocess.run(alt_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            logging.info(f"Successfully created {output_file} with alternative method")
-            return True
-        except subprocess.CalledProcessError as e2:
-            logging.error(f"Alternative method also failed: {e2.stderr.decode() if e2.stderr else str(e2)}")
-            return False
+        logging.warning(f"Failed to probe {video_file}: {e.stderr if e.stderr else str(e)}")
+        return None
+    except ValueError as e:
+        logging.warning(f"Failed to probe {video_file}: {str(e)}")
+        return None
+
+    _probe_cache[path] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'probe': probe}
+    return probe
+
+
+def probe_videos(video_files, max_workers=None):
+    """
+    Probe several video files concurrently.
+    ffprobe calls are dominated by process startup, so running them in
+    parallel threads overlaps that cost. Returns a dict of path -> probe result.
+    """
+    if not video_files:
+        return {}
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(video_files))) as executor:
+        return dict(zip(video_files, executor.map(probe_video, video_files)))
+
+
+def video_matches_target(probe, encoding=DEFAULT_ENCODING):
+    """
+    Check whether a probed file's video stream already matches the normalized
+    output (size, frame rate, codec, pixel format and H.264 profile), so it
+    can be stream-copied and concatenated with the other normalized clips.
+    Only libx264 output is matched, since hardware encoders use other profiles.
+    """
+    if not probe or encoding['encoder'] != 'libx264':
+        return False
+
+    video_streams = [s for s in probe.get('streams', []) if s.get('codec_type') == 'video']
+    if not video_streams:
+        return False
+    stream = video_streams[0]
+
+    return (
+        stream.get('codec_name') == 'h264'
+        and stream.get('width') == TARGET_WIDTH
+        and stream.get('height') == TARGET_HEIGHT
+        and stream.get('r_frame_rate') == f"{TARGET_FPS}/1"
+        and stream.get('pix_fmt') == 'yuv420p'
+        and stream.get('profile') in ('Baseline', 'Constrained Baseline')
+    )
+
+
+def audio_matches_target(probe):
+    """
+    Check whether a probed file's first audio stream is already AAC-LC at
+    48kHz stereo like the normalized clips, so it can be stream-copied.
+    HE-AAC is rejected: the joined track keeps the first file's AAC config.
+    """
+    if not probe:
+        return False
+
+    audio_streams = [s for s in probe.get('streams', []) if s.get('codec_type') == 'audio']
+    if not audio_streams:
+        return False
+    stream = audio_streams[0]
+
+    return (
+        stream.get('codec_name') == 'aac'
+        and stream.get('profile') == 'LC'
+        and stream.get('sample_rate') == '48000'
+        and stream.get('channels') == 2
+    )
+
+
+def video_duration(video_file):
+    """Return a video's duration in seconds, or None if it can't be probed."""
+    probe = probe_video(video_file)
+    try:
+        return float(probe['format']['duration'])
+    except (TypeError, KeyError, ValueError):
+        return None
+
+def fade_filter(duration):
+    """Return the filter adding a 0.5s fade in and out to a clip of the given duration."""
+    return f'fade=t=in:st=0:d=0.5,fade=t=out:st={max(0, duration-0.5)}:d=0.5'
+
 
 def normalize_single_video(args):
     """
     Normalize a single video file. Used for parallel processing.
-    Returns (index, normalized_path) or (index, None) on failure.
+    With fade set, the transition fades are applied in the same encode.
+    Returns (index, normalized_path, faded) or (index, None, False) on failure.
     """
-    i, video_file, temp_dir = args
-
-    # Standard resolution and frame rate for all videos - using portrait orientation
-    target_width = 720
-    target_height = 1280
-    target_fps = 30
+    i, video_file, temp_dir, encoding, fade = args
 
     base_name = os.path.basename(video_file)
     # Ensure output is always .mp4
     base_name_no_ext = os.path.splitext(base_name)[0]
     normalized_path = os.path.join(temp_dir, f"norm_{i}_{base_name_no_ext}.mp4")
 
+    probe = probe_video(video_file)
+
+    # Without loudnorm there's nothing to do to audio that's already AAC at
+    # 48kHz stereo, so it's copied instead of decoded and re-encoded
+    copy_audio = not encoding['loudnorm'] and audio_matches_target(probe)
+    if copy_audio:
+        audio_args = ['-c:a', 'copy']
+    else:
+        audio_args = [
+            *audio_filter_args(encoding),
+            '-c:a', 'aac',
+            '-b:a', '256k',
+            '-ar', '48000',
+            '-ac', '2',
+        ]
+
+    if not fade and video_matches_target(probe, encoding):
+        # The video stream is already in the target format, so only the
+        # audio may need re-encoding; this skips the expensive libx264 pass.
+        # With matching audio too, the file is just remuxed. A clip that
+        # needs fades is re-encoded anyway, so it skips this and gets them
+        # in the one encode below
+        cmd = [
+            'ffmpeg',
+            '-y',
+            '-i', video_file,
+            '-map', '0:v:0',
+            '-map', '0:a:0' if copy_audio else '0:a:0?',
+            '-c:v', 'copy',
+            *audio_args,
+            *MP4_TIMESCALE_ARGS,
+            normalized_path
+        ]
+        try:
+            run_ffmpeg(cmd)
+            logging.info(f"Normalized {video_file} ({'remuxed' if copy_audio else 'video stream copied'})")
+            return (i, normalized_path, False)
+        except subprocess.CalledProcessError as e:
+            logging.warning(f"Stream copy failed for {video_file}, re-encoding: {e.stderr if e.stderr else str(e)}")
+
+    # The video is re-encoded anyway, so add the transition fades here rather
+    # than in a second encode pass. The source's duration is already cached
+    # from probing it above
+    duration = video_duration(video_file) if fade else None
+    fade_filters = [fade_filter(duration)] if duration else []
+
     # Normalize with loudnorm for consistent audio levels
     # Using two-pass loudnorm would be ideal but single-pass is good enough
+    # Intermediate files are written without -movflags +faststart: moving the
+    # moov atom to the front rewrites the whole file, and only the final
+    # concatenated video needs to be streamable
     cmd = [
         'ffmpeg',
         '-y',
-        '-i', video_file,
-        '-vf', f'scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2',
-        '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',  # EBU R128 loudness normalization
-        '-r', str(target_fps),
-        '-c:v', 'libx264',
-        '-pix_fmt', 'yuv420p',
-        '-profile:v', 'baseline',
-        '-level', '3.0',
-        '-movflags', '+faststart',
-        '-preset', 'medium',
-        '-crf', '23',
-        '-c:a', 'aac',
-        '-b:a', '256k',
-        '-ar', '48000',
-        '-ac', '2',
+        *encoder_input_args(encoding),
+        *input_args(encoding, video_file),
+        # FFmpeg would otherwise pick the audio stream with the most
+        # channels, which needn't be the first one audio_matches_target checked
+        *(['-map', '0:v:0', '-map', '0:a:0'] if copy_audio else []),
+        *video_filter_args(
+            encoding,
+            f'scale={TARGET_WIDTH}:{TARGET_HEIGHT}:force_original_aspect_ratio=decrease',
+            f'pad={TARGET_WIDTH}:{TARGET_HEIGHT}:(ow-iw)/2:(oh-ih)/2',
+            *fade_filters
+        ),
+        '-r', str(TARGET_FPS),
+        *video_encoder_args(encoding),
+        *audio_args,
+        *MP4_TIMESCALE_ARGS,
         normalized_path
     ]
 
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        run_ffmpeg(cmd)
         logging.info(f"Normalized {video_file}")
-        return (i, normalized_path)
+        return (i, normalized_path, bool(fade_filters))
     except subprocess.CalledProcessError as e:
-        logging.error(f"Failed to normalize {video_file}: {e.stderr.decode() if e.stderr else str(e)}")
+        logging.error(f"Failed to normalize {video_file}: {e.stderr if e.stderr else str(e)}")
         # Fallback without loudnorm
         try:
             simple_cmd = [
                 'ffmpeg',
                 '-y',
-                '-i', video_file,
-                '-c:v', 'libx264',
-                '-pix_fmt', 'yuv420p',
-                '-profile:v', 'baseline',
-                '-level', '3.0',
-                '-movflags', '+faststart',
+                *encoder_input_args(encoding),
+                *input_args(encoding, video_file),
+                *video_filter_args(encoding, *fade_filters),
+                *video_encoder_args(encoding),
                 '-c:a', 'aac',
                 '-b:a', '256k',
                 '-ar', '48000',
                 '-ac', '2',
+                *MP4_TIMESCALE_ARGS,
                 normalized_path
             ]
-            subprocess.run(simple_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            run_ffmpeg(simple_cmd)
             logging.info(f"Simple conversion of {video_file}")
-            return (i, normalized_path)
+            return (i, normalized_path, bool(fade_filters))
         except subprocess.CalledProcessError:
             logging.warning(f"All normalization attempts failed for {video_file}")
-            return (i, None)
+            return (i, None, False)
 
 
-def normalize_videos(video_files, temp_dir):
+def normalize_videos(video_files, temp_dir, max_workers=MAX_WORKERS, encoding=DEFAULT_ENCODING, fade=(),
+                     show_progress=True):
     """
     Normalize videos to ensure they can be concatenated properly.
     Uses parallel processing for faster execution.
     Includes audio loudness normalization for consistent volume.
+    Progress is printed unless show_progress is False.
+
+    Videos in fade get their transition fades applied while they're
+    re-encoded. Returns a list aligned with video_files, holding a
+    (normalized_path, faded) tuple for each input or None where
+    normalization failed.
     """
     if not video_files:
         return []
@@ -273,79 +986,310 @@ def normalize_videos(video_files, temp_dir):
     results = [None] * total
     completed = 0
 
-    print(f"\nNormalizing {total} video(s)...")
+    if show_progress:
+        print(f"\nNormalizing {total} video(s) using {max_workers} worker(s)...")
 
-    # Prepare arguments for parallel processing
-    args_list = [(i, video_file, temp_dir) for i, video_file in enumerate(video_files)]
+    # Prepare arguments for parallel processing, sharing the cores between workers
+    job_encoding = resolve_encoding(encoding, max_workers)
+    args_list = [
+        (i, video_file, temp_dir, job_encoding, video_file in fade)
+        for i, video_file in enumerate(video_files)
+    ]
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(normalize_single_video, args): args[0] for args in args_list}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(normalize_single_video, args) for args in args_list]
 
         for future in as_completed(futures):
-            idx, normalized_path = future.result()
-            results[idx] = normalized_path
+            idx, normalized_path, faded = future.result()
+            if normalized_path:
+                results[idx] = (normalized_path, faded)
             completed += 1
-            print_progress(completed, total, prefix="Normalizing")
+            if show_progress:
+                print_progress(completed, total, prefix="Normalizing")
 
-    # Filter out None values (failed normalizations) while preserving order
-    return [path for path in results if path is not None]
+    return results
 
-def add_transitions(videos, temp_dir):
+def normalize_and_concat(video_files, output_file, passthrough=(), fade=False, encoding=DEFAULT_ENCODING):
+    """
+    Normalize and concatenate videos in a single FFmpeg pass.
+    Each input is scaled, padded and resampled inside one filtergraph feeding
+    the concat filter, so every frame is decoded and encoded exactly once and
+    no intermediate files are written. Files in passthrough (title cards) are
+    already in the output format and skip loudness normalization and fades.
+    """
+    if not video_files:
+        logging.warning(f"No videos to concatenate for {output_file}")
+        return False
+
+    # Written to a partial file and moved into place on success
+    part_file = output_file + '.part'
+
+    job_encoding = resolve_encoding(encoding, 1)
+    cmd = ['ffmpeg', '-y', *encoder_input_args(job_encoding)]
+    filters = []
+    concat_inputs = []
+
+    for i, video_file in enumerate(video_files):
+        cmd.extend(input_args(job_encoding, video_file))
+
+        video_chain = [
+            f'scale={TARGET_WIDTH}:{TARGET_HEIGHT}:force_original_aspect_ratio=decrease',
+            f'pad={TARGET_WIDTH}:{TARGET_HEIGHT}:(ow-iw)/2:(oh-ih)/2',
+            f'fps={TARGET_FPS}',
+            'setsar=1',
+            'format=yuv420p'
+        ]
+        audio_chain = [
+            'aresample=48000',
+            'aformat=sample_fmts=fltp:channel_layouts=stereo'
+        ]
+
+        if video_file not in passthrough:
+            if job_encoding['loudnorm']:
+                audio_chain.insert(0, LOUDNORM_FILTER)
+            duration = video_duration(video_file) if fade else None
+            if duration:
+                video_chain.append(fade_filter(duration))
+
+        filters.append(f"[{i}:v]{','.join(video_chain)}[v{i}]")
+        filters.append(f"[{i}:a]{','.join(audio_chain)}[a{i}]")
+        concat_inputs.append(f"[v{i}][a{i}]")
+
+    # VAAPI needs the concatenated frames uploaded to the GPU before encoding
+    upload = video_filter_args(job_encoding)
+    concat_video = '[vcat]' if upload else '[v]'
+    filters.append(f"{''.join(concat_inputs)}concat=n={len(video_files)}:v=1:a=1{concat_video}[a]")
+    if upload:
+        filters.append(f"[vcat]{upload[1]}[v]")
+
+    cmd.extend([
+        '-filter_complex', ';'.join(filters),
+        '-map', '[v]',
+        '-map', '[a]',
+        *video_encoder_args(job_encoding),
+        '-c:a', 'aac',
+        '-b:a', '256k',
+        '-ar', '48000',
+        '-ac', '2',
+        '-movflags', '+faststart',
+        '-f', 'mp4',
+        part_file
+    ])
+
+    try:
+        logging.info(f"Running single-pass FFmpeg command for {output_file}")
+        run_ffmpeg(cmd)
+        os.replace(part_file, output_file)
+        logging.info(f"Successfully created {output_file}")
+        return True
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Single-pass processing failed: {e.stderr if e.stderr else str(e)}")
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        return False
+
+def add_transitions(videos, temp_dir, encoding=DEFAULT_ENCODING, skip=(), show_progress=True):
     """
     Add visual fade transitions between videos.
-    Shows progress during processing.
+    Videos in skip already have their fades and are passed through as is.
+    Shows progress during processing unless show_progress is False.
     """
-    if len(videos) <= 1:
+    if len(videos) <= 1 or all(video in skip for video in videos):
         return videos
 
     total = len(videos)
     processed_videos = []
+    job_encoding = resolve_encoding(encoding, 1)
+
+    if show_progress:
+        print(f"\nAdding transitions to {total} video(s)...")
 
-    print(f"\nAdding transitions to {total} video(s)...")
+    # Probe all durations up front in parallel; the loop below reads them
+    # from the probe cache
+    probe_videos([video for video in videos if video not in skip])
 
     for i, video in enumerate(videos):
-        duration_cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'csv=p=0',
-            video
-        ]
+        if video in skip:
+            processed_videos.append(video)
+            if show_progress:
+                print_progress(i + 1, total, prefix="Transitions")
+            continue
 
         try:
-            duration = float(subprocess.run(duration_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout.decode().strip())
+            duration = video_duration(video)
+            if duration is None:
+                raise ValueError(f"could not determine the duration of {video}")
 
-            fade_file = os.path.join(temp_dir, f"fade_{i}.mp4")
+            # Name fade files after their source so teachers processed in
+            # parallel don't overwrite each other's clips
+            base_name_no_ext = os.path.splitext(os.path.basename(video))[0]
+            fade_file = os.path.join(temp_dir, f"fade_{i}_{base_name_no_ext}.mp4")
 
             cmd = [
                 'ffmpeg',
                 '-y',
-                '-i', video,
-                '-vf', f'fade=t=in:st=0:d=0.5,fade=t=out:st={max(0, duration-0.5)}:d=0.5',
-                '-c:v', 'libx264',
-                '-pix_fmt', 'yuv420p',
-                '-profile:v', 'baseline',
-                '-level', '3.0',
-                '-movflags', '+faststart',
+                *encoder_input_args(job_encoding),
+                *input_args(job_encoding, video),
+                *video_filter_args(job_encoding, fade_filter(duration)),
+                *video_encoder_args(job_encoding),
                 '-c:a', 'copy',
+                *MP4_TIMESCALE_ARGS,
                 fade_file
             ]
 
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            run_ffmpeg(cmd)
             processed_videos.append(fade_file)
             logging.info(f"Added fade effects to video {i}")
         except (subprocess.CalledProcessError, ValueError) as e:
             logging.error(f"Failed to add fade effects: {str(e)}")
             processed_videos.append(video)
 
-        print_progress(i + 1, total, prefix="Transitions")
+        if show_progress:
+            print_progress(i + 1, total, prefix="Transitions")
 
     return processed_videos
 
-def process_videos(input_dir, output_dir, temp_dir, normalize=True, title_cards=True):
+def output_is_up_to_date(output_file, video_files):
+    """Check whether output_file exists and is newer than all of its input videos."""
+    try:
+        output_mtime = os.stat(output_file).st_mtime
+        return all(os.stat(video).st_mtime < output_mtime for video in video_files)
+    except OSError:
+        return False
+
+def add_title_cards(teacher_name, videos, student_names, temp_dir, encoding=DEFAULT_ENCODING,
+                    show_progress=True, max_outputs=1):
+    """
+    Create the teacher intro card and a name card for each student, at most
+    max_outputs encoders at a time (see render_title_cards).
+    Returns (video_list, card_paths) where video_list interleaves the cards
+    with the videos and card_paths holds the title cards that were created.
+    """
+    if show_progress:
+        print(f"\nCreating title cards...")
+
+    # Teacher intro card followed by a name card for each student
+    teacher_display = format_teacher_name(teacher_name)
+    cards = [(f"For {teacher_display}", os.path.join(temp_dir, f"intro_{teacher_name}.mp4"), 3.0, 56)]
+    for idx, student_name in enumerate(student_names):
+        student_display = format_student_name(student_name)
+        cards.append((f"From: {student_display}", os.path.join(temp_dir, f"card_{teacher_name}_{idx}.mp4"), 1.5, 44))
+
+    intro_result, *card_results = create_title_cards(cards, encoding=encoding, max_outputs=max_outputs)
+    card_paths = {card for card in [intro_result, *card_results] if card}
+
+    final_video_list = [intro_result] if intro_result else []
+    for video, card_result in zip(videos, card_results):
+        if card_result:
+            final_video_list.append(card_result)
+        final_video_list.append(video)
+
+    if show_progress:
+        print_progress(len(student_names), len(student_names), prefix="Title cards")
+    return final_video_list, card_paths
+
+def process_teacher(teacher_name, video_tuples, output_file, temp_dir, normalized, title_cards=True,
+                    single_pass=False, max_workers=MAX_WORKERS, encoding=DEFAULT_ENCODING, position=(1, 1),
+                    parallel_teachers=1):
+    """
+    Build one teacher's video from their (path, student_name) tuples.
+    normalized maps each input path to its (normalized_path, faded) tuple
+    (or None if normalization failed), or is None when normalization is
+    disabled. With single_pass the videos are normalized and concatenated
+    in one FFmpeg pass, falling back to the per-file path if that fails.
+
+    max_workers is this teacher's share of the workers, and encoding holds
+    the unresolved settings, which are split between the parallel_teachers
+    teachers built at the same time. Progress is only printed when teachers
+    are built one at a time, since parallel progress bars overwrite each other.
+    Returns the result dict, or None if the video couldn't be created.
+    """
+    show_progress = parallel_teachers == 1
+    if show_progress:
+        print(f"\n{'='*60}")
+        print(f"Processing teacher {position[0]}/{position[1]}: {format_teacher_name(teacher_name)}")
+        print(f"{'='*60}")
+
+    # Each FFmpeg run of this teacher gets its share of the cores
+    teacher_encoding = resolve_encoding(encoding, parallel_teachers)
+
+    videos = [v[0] for v in video_tuples]
+    student_names = [v[1] for v in video_tuples]
+    result = {
+        'teacher': teacher_name,
+        'video_count': len(videos),
+        'output_file': output_file
+    }
+
+    if single_pass:
+        if title_cards:
+            video_list, card_paths = add_title_cards(teacher_name, videos, student_names, temp_dir,
+                                                      encoding=teacher_encoding, show_progress=show_progress,
+                                                      max_outputs=max_workers)
+        else:
+            video_list, card_paths = videos, set()
+
+        if show_progress:
+            print(f"\nNormalizing and concatenating in a single pass...")
+        if normalize_and_concat(video_list, output_file, passthrough=card_paths,
+                                fade=len(videos) > 1, encoding=teacher_encoding):
+            return result
+
+        # Stay within this teacher's share of the workers, and split its
+        # share of the cores between them
+        logging.warning(f"Falling back to per-file normalization for {teacher_name}")
+        fade = set(videos) if len(videos) > 1 else ()
+        fallback_encoding = resolve_encoding(encoding, parallel_teachers * max_workers)
+        normalized.update(zip(videos, normalize_videos(videos, temp_dir, max_workers=max_workers,
+                                                       encoding=fallback_encoding, fade=fade,
+                                                       show_progress=show_progress)))
+
+    faded = set()
+    if normalized is not None:
+        # Drop videos that failed to normalize, keeping student names aligned
+        pairs = [(normalized[video], name) for video, name in zip(videos, student_names) if normalized[video]]
+        processed_videos = [p[0][0] for p in pairs]
+        faded = {p[0][0] for p in pairs if p[0][1]}
+        student_names = [p[1] for p in pairs]
+    else:
+        processed_videos = videos
+
+    # Add transitions to any videos that weren't faded while normalizing
+    videos_with_transitions = add_transitions(processed_videos, temp_dir, encoding=teacher_encoding, skip=faded,
+                                              show_progress=show_progress)
+
+    # Add title cards if requested
+    if title_cards and videos_with_transitions:
+        final_video_list, _ = add_title_cards(teacher_name, videos_with_transitions, student_names,
+                                             temp_dir, encoding=teacher_encoding, show_progress=show_progress,
+                                             max_outputs=max_workers)
+    else:
+        final_video_list = videos_with_transitions
+
+    # Concatenate videos. The clips aren't probed for duration directives:
+    # the concat demuxer reads each file's duration from the file anyway
+    if show_progress:
+        print(f"\nConcatenating final video...")
+    if concatenate_videos(final_video_list, output_file, temp_dir, stream_copy=normalized is not None,
+                          encoding=teacher_encoding):
+        return result
+    return None
+
+def process_videos(input_dir, output_dir, temp_dir, normalize=True, title_cards=True,
+                   max_workers=MAX_WORKERS, single_pass=True, encoding=DEFAULT_ENCODING, force=False):
     """
     Process all videos in the input directory, grouping them by teacher
     and concatenating them into single videos in the output directory.
+
+    With single_pass, teachers' videos are normalized and concatenated in one
+    FFmpeg invocation. A teacher with a single video that already matches the
+    output format keeps the per-file path, where its video stream is copied
+    rather than re-encoded, as do teachers with more than
+    MAX_SINGLE_PASS_INPUTS inputs. With more than one video the fades mean
+    every video is re-encoded anyway.
+
+    Teachers whose output video is newer than all of their inputs are skipped
+    unless force is set.
     """
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(temp_dir, exist_ok=True)
@@ -353,96 +1297,136 @@ def process_videos(input_dir, output_dir, temp_dir, normalize=True, title_cards=
     # Group videos by teacher, keeping track of student names
     teacher_videos = defaultdict(list)
 
-    for filename in os.listdir(input_dir):
-        if is_video_file(filename):
-            filepath = os.path.join(input_dir, filename)
-            teacher_name, student_name = parse_filename(filename)
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            # The extension check is a set lookup, so most non-video files
+            # are skipped before anything else is done with them
+            if not is_video_file(entry.name) or not entry.is_file():
+                continue
 
+            teacher_name, student_name = parse_filename(entry.name)
             if teacher_name:
-                teacher_videos[teacher_name].append((filepath, student_name))
+                teacher_videos[teacher_name].append((entry.path, student_name))
                 logging.info(f"Added video for {teacher_name} from {student_name}")
             else:
-                logging.warning(f"Skipping {filename} - doesn't match expected format")
+                logging.warning(f"Skipping {entry.name} - doesn't match expected format")
 
-    # Process each teacher's videos
+    # Sort each teacher's videos by student name
+    for video_tuples in teacher_videos.values():
+        video_tuples.sort(key=itemgetter(1))
+
+    # Skip teachers whose video is already newer than all of their inputs
     results = []
+    if not force:
+        for teacher_name in list(teacher_videos):
+            output_file = os.path.join(output_dir, f"{teacher_name}_appreciation.mp4")
+            videos = [v[0] for v in teacher_videos[teacher_name]]
+            if output_is_up_to_date(output_file, videos):
+                logging.info(f"Skipping {teacher_name} - {output_file} is up to date")
+                results.append({
+                    'teacher': teacher_name,
+                    'video_count': len(videos),
+                    'output_file': output_file
+                })
+                del teacher_videos[teacher_name]
+
+    single_pass_teachers = set()
+    if normalize and single_pass:
+        probes = probe_videos([v[0] for video_tuples in teacher_videos.values() for v in video_tuples])
+        for teacher_name, video_tuples in teacher_videos.items():
+            # An intro card plus one card per video when title cards are on
+            input_count = 2 * len(video_tuples) + 1 if title_cards else len(video_tuples)
+            if input_count > MAX_SINGLE_PASS_INPUTS:
+                continue
+            # Only a lone video gets no fades, so only then can its video
+            # stream be copied instead of re-encoded
+            if len(video_tuples) > 1 or not video_matches_target(probes[video_tuples[0][0]], encoding):
+                single_pass_teachers.add(teacher_name)
+
+    # Normalize every teacher's videos in a single pool so the workers stay
+    # busy across teacher boundaries instead of draining after each teacher
+    if normalize:
+        all_videos = [
+            v[0]
+            for teacher_name, video_tuples in teacher_videos.items()
+            if teacher_name not in single_pass_teachers
+            for v in video_tuples
+        ]
+        # Fade only the videos of teachers with more than one video, matching
+        # where add_transitions would add them
+        fade = {
+            v[0]
+            for video_tuples in teacher_videos.values()
+            if len(video_tuples) > 1
+            for v in video_tuples
+        }
+        normalized = dict(zip(all_videos, normalize_videos(all_videos, temp_dir, max_workers=max_workers,
+                                                           encoding=encoding, fade=fade)))
+    else:
+        normalized = None
+
+    # Teachers don't depend on each other, so run their transitions, title
+    # cards and concatenation in parallel. Each teacher gets an equal share
+    # of the workers for the FFmpeg runs it starts, so together they never
+    # run more than max_workers at once
+    teacher_workers = max(1, min(len(teacher_videos), max_workers))
+    workers_per_teacher = max(1, max_workers // teacher_workers)
     total_teachers = len(teacher_videos)
 
-    for teacher_idx, (teacher_name, video_tuples) in enumerate(teacher_videos.items(), 1):
-        print(f"\n{'='*60}")
-        print(f"Processing teacher {teacher_idx}/{total_teachers}: {format_teacher_name(teacher_name)}")
-        print(f"{'='*60}")
-
-        # Sort by student name
-        video_tuples.sort(key=lambda x: x[1])
-        videos = [v[0] for v in video_tuples]
-        student_names = [v[1] for v in video_tuples]
-
-        # Normalize videos if requested
-        if normalize:
-            processed_videos = normalize_videos(videos, temp_dir)
-        else:
-            processed_videos = videos
-
-        # Add transitions
-        videos_with_transitions = add_transitions(processed_videos, temp_dir)
-
-        # Add title cards if requested
-        final_video_list = []
-        if title_cards and videos_with_transitions:
-            print(f"\nCreating title cards...")
-
-            # Create teacher intro card
-            teacher_display = format_teacher_name(teacher_name)
-            intro_card = os.path.join(temp_dir, f"intro_{teacher_name}.mp4")
-            intro_result = create_title_card(
-                f"For {teacher_display}",
-                intro_card,
-                duration=3.0,
-                font_size=56
+    if teacher_workers > 1:
+        print(f"\nBuilding {total_teachers} teacher video(s) using {teacher_workers} worker(s)...")
+
+    with ThreadPoolExecutor(max_workers=teacher_workers) as executor:
+        futures = [
+            executor.submit(
+                process_teacher,
+                teacher_name,
+                video_tuples,
+                os.path.join(output_dir, f"{teacher_name}_appreciation.mp4"),
+                temp_dir,
+                normalized,
+                title_cards=title_cards,
+                single_pass=teacher_name in single_pass_teachers,
+                max_workers=workers_per_teacher,
+                encoding=encoding,
+                position=(teacher_idx, total_teachers),
+                parallel_teachers=teacher_workers
             )
-            if intro_result:
-                final_video_list.append(intro_result)
-
-            # Add student name cards before each video
-            for idx, (video, student_name) in enumerate(zip(videos_with_transitions, student_names)):
-                student_display = format_student_name(student_name)
-                student_card = os.path.join(temp_dir, f"card_{teacher_name}_{idx}.mp4")
-                card_result = create_title_card(
-                    f"From: {student_display}",
-                    student_card,
-                    duration=1.5,
-                    font_size=44
-                )
-                if card_result:
-                    final_video_list.append(card_result)
-                final_video_list.append(video)
-
-            print_progress(len(student_names), len(student_names), prefix="Title cards")
-        else:
-            final_video_list = videos_with_transitions
-
-        # Create output filename
-        output_file = os.path.join(output_dir, f"{teacher_name}_appreciation.mp4")
-
-        # Concatenate videos
-        print(f"\nConcatenating final video...")
-        success = concatenate_videos(final_video_list, output_file, temp_dir)
+            for teacher_idx, (teacher_name, video_tuples) in enumerate(teacher_videos.items(), 1)
+        ]
+        if teacher_workers > 1:
+            for completed, _ in enumerate(as_completed(futures), 1):
+                print_progress(completed, total_teachers, prefix="Teachers")
 
-        if success:
-            results.append({
-                'teacher': teacher_name,
-                'video_count': len(videos),
-                'output_file': output_file
-            })
+        for future in futures:
+            result = future.result()
+            if result:
+                results.append(result)
 
     return results
 
 def cleanup(temp_dir):
-    """Clean up temporary files."""
-    if os.path.exists(temp_dir):
+    """
+    Clean up temporary files.
+    The temporary directory is flat, so files are unlinked straight from a
+    single os.scandir pass; shutil.rmtree is only used if it has subdirectories.
+    """
+    if not os.path.exists(temp_dir):
+        return
+
+    has_subdirs = False
+    with os.scandir(temp_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                has_subdirs = True
+            else:
+                os.unlink(entry.path)
+
+    if has_subdirs:
         shutil.rmtree(temp_dir)
-        logging.info(f"Cleaned up temporary directory: {temp_dir}")
+    else:
+        os.rmdir(temp_dir)
+    logging.info(f"Cleaned up temporary directory: {temp_dir}")
 
 def main():
     parser = argparse.ArgumentParser(description='Teacher Appreciation Video Splicing Tool')
@@ -452,6 +1436,34 @@ def main():
     parser.add_argument('--no-normalize', action='store_true', help='Skip video normalization')
     parser.add_argument('--no-title-cards', action='store_true', help='Skip title cards')
     parser.add_argument('--keep-temp', action='store_true', help='Keep temporary files')
+    parser.add_argument('--no-single-pass', action='store_true',
+                        help='Normalize each video separately instead of normalizing and concatenating '
+                             'each teacher\'s videos in one FFmpeg pass')
+    # Single pass is the default now; still accept the old opt-in flag
+    parser.add_argument('--single-pass', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--encoder', choices=['auto', *HW_ENCODERS, 'libx264'], default='auto',
+                        help='Video encoder; auto picks the first working hardware encoder, '
+                             'falling back to libx264 (default: auto)')
+    parser.add_argument('--no-hwaccel', action='store_true',
+                        help='Always encode with libx264, same as --encoder libx264')
+    parser.add_argument('--no-loudnorm', action='store_true',
+                        help='Skip audio loudness normalization, so matching clips can be copied without re-encoding')
+    parser.add_argument('--fast', action='store_true',
+                        help=f'Favor encoding speed: libx264 preset {FAST_PRESET} at CRF {FAST_CRF}, '
+                             f'or the fastest hardware encoder preset')
+    parser.add_argument('--preset',
+                        help=f"libx264 preset for re-encoded videos (default: {DEFAULT_ENCODING['preset']}, "
+                             f"or {FAST_PRESET} with --fast)")
+    parser.add_argument('--crf', type=int,
+                        help=f"libx264 CRF quality, lower is better (default: {DEFAULT_ENCODING['crf']}, "
+                             f"or {FAST_CRF} with --fast)")
+    parser.add_argument('--encoder-threads', type=int, default=DEFAULT_ENCODING['threads'],
+                        help='Threads per FFmpeg encode, 0 splits the CPU cores between workers (default: 0)')
+    parser.add_argument('--force', action='store_true',
+                        help='Rebuild every video, even if it is newer than its inputs')
+    parser.add_argument('--workers', '-w', type=int,
+                        help=f'Number of videos to process in parallel (default: {MAX_WORKERS}, '
+                             f'or the NVENC session limit when encoding with NVENC)')
 
     args = parser.parse_args()
 
@@ -463,13 +1475,54 @@ def main():
     logging.info(f"Input directory: {args.input}")
     logging.info(f"Output directory: {args.output}")
 
-    results = process_videos(
-        args.input,
-        args.output,
-        args.temp,
-        normalize=not args.no_normalize,
-        title_cards=not args.no_title_cards
-    )
+    if args.no_hwaccel:
+        encoder = 'libx264'
+    elif args.encoder == 'auto':
+        encoder = detect_hw_encoder()
+    else:
+        encoder = args.encoder
+        if encoder != 'libx264' and not (has_encoder(encoder) and hw_encoder_works(encoder)):
+            parser.error(f"encoder {encoder} isn't supported by FFmpeg or the hardware on this host")
+    logging.info(f"Video encoder: {encoder}")
+
+    preset = args.preset or (FAST_PRESET if args.fast else DEFAULT_ENCODING['preset'])
+    crf = args.crf if args.crf is not None else (FAST_CRF if args.fast else DEFAULT_ENCODING['crf'])
+
+    workers = MAX_WORKERS if args.workers is None else max(1, args.workers)
+    if encoder == 'h264_nvenc':
+        # The GPU rather than the CPU cores limits NVENC, and workers beyond
+        # its session limit would fail to open an encoder
+        session_limit = nvenc_session_limit(NVENC_MAX_SESSIONS if args.workers is None else workers)
+        logging.info(f"NVENC session limit: {session_limit}")
+        workers = session_limit if args.workers is None else min(workers, session_limit)
+    logging.info(f"Workers: {workers}")
+
+    # Reuse ffprobe results from earlier runs, and save them even if this
+    # run fails part way so a re-run doesn't probe everything again
+    probe_cache_file = os.path.join(os.path.dirname(os.path.abspath(args.temp)), PROBE_CACHE_FILE)
+    load_probe_cache(probe_cache_file)
+
+    try:
+        results = process_videos(
+            args.input,
+            args.output,
+            args.temp,
+            normalize=not args.no_normalize,
+            title_cards=not args.no_title_cards,
+            max_workers=workers,
+            single_pass=not args.no_single_pass,
+            encoding={
+                'encoder': encoder,
+                'preset': preset,
+                'crf': crf,
+                'threads': max(0, args.encoder_threads),
+                'fast': args.fast,
+                'loudnorm': not args.no_loudnorm,
+            },
+            force=args.force
+        )
+    finally:
+        save_probe_cache(probe_cache_file, exclude_dir=args.temp)
 
     # Print summary
     print("\n" + "="*60)